@@ -0,0 +1,69 @@
+import argparse
+import glob
+import os
+import statistics
+import time
+
+import requests
+
+# Latency benchmark: /explain vs plain /predict on the bundled ornament images.
+# Start the backend first:  uvicorn main:app --port 8000
+
+ASSETS = os.path.join(os.path.dirname(__file__), "..", "frontend", "assets", "Ornaments")
+
+
+def timed(fn, repeats):
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        response = fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+    return latencies
+
+
+def report(name, latencies, images_per_call):
+    latencies = sorted(latencies)
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    mean = statistics.mean(latencies)
+    print(f"{name:<32} mean {mean:8.1f} ms   p95 {p95:8.1f} ms   "
+          f"per image {mean / images_per_call:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(ASSETS, "*")))
+    images = [open(path, "rb").read() for path in paths]
+    print(f"{len(images)} images, {args.repeats} repeats\n")
+
+    # With NEAR_DUPLICATE_CACHE=1 only the first /predict per image runs the
+    # model and the repeats are cache hits, so the two are reported apart
+    cold, cached = [], []
+    for data in images:
+        latencies = timed(
+            lambda: requests.post(f"{args.url}/predict", files={"file": data}),
+            args.repeats
+        )
+        cold.append(latencies[0])
+        cached += latencies[1:]
+    report("/predict (1 image, cold)", cold, 1)
+    if cached:
+        report("/predict (1 image, cached)", cached, 1)
+
+    def explain(fmt):
+        return requests.post(f"{args.url}/explain", params={"format": fmt},
+                             files=[("files", data) for data in images])
+
+    # The first batch misses the heatmap cache, so run this against a
+    # freshly started server
+    report("/explain array (batch, cold)", timed(lambda: explain("array"), 1), len(images))
+    report("/explain array (batch, cached)", timed(lambda: explain("array"), args.repeats), len(images))
+    report("/explain png (batch, cached)", timed(lambda: explain("png"), args.repeats), len(images))
+
+
+if __name__ == "__main__":
+    main()
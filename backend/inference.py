@@ -0,0 +1,86 @@
+from PIL import Image
+import torch
+import torchvision.transforms as transforms
+import torch.nn as nn
+import io
+
+from torchvision.models import vit_b_16
+
+# Model, preprocessing and classification shared by the API (main.py) and the
+# background job workers (jobs.py). Importing this module loads the model.
+
+# ------------------ MODEL LOADING ------------------
+
+NUM_CLASSES = 17
+
+try:
+    model = vit_b_16(weights=None)
+
+    # EXACT training head (single Linear at index 1)
+    model.heads = nn.Sequential(
+        nn.Identity(),
+        nn.Linear(768, NUM_CLASSES)
+    )
+
+    state_dict = torch.load("vit_ornament_model.pth", map_location="cpu")
+    model.load_state_dict(state_dict)
+    model.eval()
+
+    print("✅ Model loaded successfully")
+
+except Exception as e:
+    print("❌ Model loading failed:", e)
+    model = None
+    
+# ------------------ IMAGE PREPROCESSING ------------------
+# IMPORTANT: ViT normalization
+transform = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.ToTensor(),
+    transforms.Normalize(
+        mean=[0.485, 0.456, 0.406],
+        std=[0.229, 0.224, 0.225]
+    )
+])
+
+# ------------------ CLASS LABELS ------------------
+
+classes = [
+    'Bajuband',
+    'Bakuli Haar',
+    'Bugadi',
+    'Chinchpeti',
+    'Jodvi',
+    'Kambarpatta',
+    'Kolhapuri Saaj',
+    'Kudya',
+    'Laxmi Haar',
+    'Mangalsutra',
+    'Mohan Mala',
+    'Nath',
+    'Patlya',
+    'Surya Haar',
+    'Tanmani',
+    'Thushi',
+    'Tode'
+]
+
+# ------------------ INFERENCE ------------------
+
+def load_image(image_bytes):
+    return Image.open(io.BytesIO(image_bytes)).convert("RGB")
+
+
+def classify_images(images):
+    # One forward pass over a list of PIL images -> [(label, confidence), ...]
+    batch = torch.stack([transform(img) for img in images])
+
+    with torch.no_grad():
+        outputs = model(batch)
+        probs = torch.softmax(outputs, dim=1)
+        confidences, predicted = probs.max(dim=1)
+
+    return [
+        (classes[p], round(c, 4))
+        for p, c in zip(predicted.tolist(), confidences.tolist())
+    ]
@@ -0,0 +1,423 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# ------------------ CONFIG ------------------
+# Local job queue for bulk classification: SQLite is the queue, a pool of
+# worker processes drains it, no external broker needed. Each worker loads its
+# own copy of the model, so the pool only starts once there is work to do;
+# JOB_WORKERS=0 disables the queue.
+
+DB_PATH = os.environ.get("JOBS_DB", "jobs.db")
+NUM_WORKERS = int(os.environ.get("JOB_WORKERS", "1"))
+BATCH_SIZE = 8          # images per forward pass in a worker
+MAX_ATTEMPTS = 3        # a task is failed after crashing this many workers
+MAX_STARTUP_FAILURES = 3  # a worker dying this often before it is ready is given up on
+POLL_INTERVAL = 0.5     # seconds
+MAX_FILES = 256         # images per job
+MAX_FILE_BYTES = 10 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id       TEXT PRIMARY KEY,
+    priority INTEGER NOT NULL,
+    status   TEXT NOT NULL,
+    total    INTEGER NOT NULL,
+    created  REAL NOT NULL,
+    finished REAL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id     TEXT NOT NULL,
+    position   INTEGER NOT NULL,
+    priority   INTEGER NOT NULL,
+    status     TEXT NOT NULL,
+    attempts   INTEGER NOT NULL DEFAULT 0,
+    worker     INTEGER,
+    image      BLOB,
+    prediction TEXT,
+    confidence REAL,
+    error      TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_queue ON tasks (status, priority DESC, id);
+CREATE INDEX IF NOT EXISTS tasks_job ON tasks (job_id, position);
+CREATE TABLE IF NOT EXISTS workers (
+    id        INTEGER PRIMARY KEY,
+    pid       INTEGER,
+    started   REAL,
+    processed INTEGER NOT NULL DEFAULT 0,
+    failed    INTEGER NOT NULL DEFAULT 0,
+    busy      REAL NOT NULL DEFAULT 0,
+    restarts  INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def connect(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def init_db(db_path=DB_PATH):
+    conn = connect(db_path)
+    conn.executescript(SCHEMA)
+    conn.close()
+
+
+# ------------------ QUEUE ------------------
+
+def submit(images, priority=0, db_path=DB_PATH):
+    job_id = uuid.uuid4().hex
+    conn = connect(db_path)
+    with conn:
+        conn.execute("BEGIN")
+        conn.execute(
+            "INSERT INTO jobs (id, priority, status, total, created) VALUES (?, ?, 'queued', ?, ?)",
+            (job_id, priority, len(images), time.time())
+        )
+        conn.executemany(
+            "INSERT INTO tasks (job_id, position, priority, status, image) VALUES (?, ?, ?, 'queued', ?)",
+            [(job_id, i, priority, image) for i, image in enumerate(images)]
+        )
+    conn.close()
+    return job_id
+
+
+def claim_tasks(conn, worker_id, limit=BATCH_SIZE):
+    # BEGIN IMMEDIATE takes the write lock, so two workers never claim the same task.
+    # A task that was running when a worker crashed is retried on its own, so a
+    # poison image cannot take its batch mates down with it again.
+    # Idle polls only read, so they do not contend for the write lock.
+    if conn.execute("SELECT 1 FROM tasks WHERE status = 'queued' LIMIT 1").fetchone() is None:
+        return []
+
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(
+            "SELECT id, job_id, image, attempts FROM tasks WHERE status = 'queued' "
+            "ORDER BY priority DESC, id LIMIT 1"
+        ).fetchall()
+        if rows and rows[0]["attempts"] == 0:
+            rows = conn.execute(
+                "SELECT id, job_id, image, attempts FROM tasks WHERE status = 'queued' AND attempts = 0 "
+                "ORDER BY priority DESC, id LIMIT ?",
+                (limit,)
+            ).fetchall()
+        for row in rows:
+            conn.execute(
+                "UPDATE tasks SET status = 'running', worker = ?, attempts = attempts + 1 WHERE id = ?",
+                (worker_id, row["id"])
+            )
+        conn.executemany(
+            "UPDATE jobs SET status = 'running' WHERE id = ? AND status = 'queued'",
+            {(row["job_id"],) for row in rows}
+        )
+    return rows
+
+
+def finish_jobs(conn, job_ids):
+    for job_id in job_ids:
+        conn.execute(
+            "UPDATE jobs SET status = 'done', finished = ? WHERE id = ? AND NOT EXISTS "
+            "(SELECT 1 FROM tasks WHERE job_id = ? AND status IN ('queued', 'running'))",
+            (time.time(), job_id, job_id)
+        )
+
+
+def requeue_tasks(conn, worker_id=None, crashed=True):
+    # Tasks left 'running' by a dead worker go back to the queue until
+    # they hit MAX_ATTEMPTS; worker_id=None recovers everything (startup).
+    # After a clean shutdown (crashed=False) the attempt is handed back.
+    where = "status = 'running'" + ("" if worker_id is None else " AND worker = ?")
+    params = () if worker_id is None else (worker_id,)
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        if not crashed:
+            conn.execute(
+                f"UPDATE tasks SET worker = NULL, status = 'queued', attempts = attempts - 1 WHERE {where}",
+                params
+            )
+            return
+
+        job_ids = {
+            row["job_id"] for row in
+            conn.execute(f"SELECT job_id FROM tasks WHERE {where}", params)
+        }
+        conn.execute(
+            f"UPDATE tasks SET worker = NULL, "
+            f"status = CASE WHEN attempts >= {MAX_ATTEMPTS} THEN 'failed' ELSE 'queued' END, "
+            f"error = CASE WHEN attempts >= {MAX_ATTEMPTS} THEN 'Worker crashed' ELSE error END "
+            f"WHERE {where}",
+            params
+        )
+        finish_jobs(conn, job_ids)
+
+
+def has_pending_tasks(db_path=DB_PATH):
+    conn = connect(db_path)
+    row = conn.execute(
+        "SELECT 1 FROM tasks WHERE status IN ('queued', 'running') LIMIT 1"
+    ).fetchone()
+    conn.close()
+    return row is not None
+
+
+# ------------------ WORKERS ------------------
+
+def worker_loop(worker_id, db_path=DB_PATH):
+    # Imported here so the model is loaded once per worker process, and only there
+    import inference
+
+    conn = connect(db_path)
+    conn.execute(
+        "INSERT INTO workers (id, pid, started) VALUES (?, ?, ?) "
+        "ON CONFLICT (id) DO UPDATE SET pid = excluded.pid, started = excluded.started",
+        (worker_id, os.getpid(), time.time())
+    )
+
+    while True:
+        rows = claim_tasks(conn, worker_id)
+        if not rows:
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        start = time.perf_counter()
+        results, images = {}, []
+        for row in rows:
+            try:
+                images.append((row["id"], inference.load_image(row["image"])))
+            except Exception as e:
+                results[row["id"]] = (None, None, f"Invalid image: {e}")
+
+        if images:
+            # Ordinary errors (model not loaded, out of memory) fail the batch
+            # with the real message instead of crash-looping the worker
+            try:
+                predictions = inference.classify_images([image for _, image in images])
+                error = None
+            except Exception as e:
+                print(f"❌ Job worker {worker_id} inference failed:", e)
+                predictions = [(None, None)] * len(images)
+                error = f"Inference failed: {e}"
+
+            for (task_id, _), (label, confidence) in zip(images, predictions):
+                results[task_id] = (label, confidence, error)
+
+        failed = sum(1 for _, _, error in results.values() if error)
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "UPDATE tasks SET status = ?, prediction = ?, confidence = ?, error = ?, image = NULL "
+                "WHERE id = ?",
+                [
+                    ("failed" if error else "done", label, confidence, error, task_id)
+                    for task_id, (label, confidence, error) in results.items()
+                ]
+            )
+            conn.execute(
+                "UPDATE workers SET processed = processed + ?, failed = failed + ?, busy = busy + ? "
+                "WHERE id = ?",
+                (len(results) - failed, failed, time.perf_counter() - start, worker_id)
+            )
+            finish_jobs(conn, {row["job_id"] for row in rows})
+
+
+class WorkerPool:
+    """Keeps NUM_WORKERS processes alive and requeues the work of any that die."""
+
+    def __init__(self, num_workers=NUM_WORKERS, db_path=DB_PATH):
+        self.num_workers = num_workers
+        self.db_path = db_path
+        self.ctx = multiprocessing.get_context("spawn")
+        self.processes = {}
+        self.stopping = threading.Event()
+        self.supervisor = None
+        self.started = False
+        self.startup_failures = {}
+        self.failed_workers = set()
+
+    def spawn(self, worker_id):
+        process = self.ctx.Process(target=worker_loop, args=(worker_id, self.db_path), daemon=True)
+        process.start()
+        self.processes[worker_id] = process
+
+    def start(self):
+        # Idempotent: called on startup if work is pending, and on every POST /jobs
+        if self.started or self.num_workers == 0:
+            return
+        self.started = True
+
+        # Tasks still 'running' here were cut off by an unclean exit
+        init_db(self.db_path)
+        conn = connect(self.db_path)
+        requeue_tasks(conn)
+        conn.close()
+
+        for worker_id in range(self.num_workers):
+            self.spawn(worker_id)
+
+        self.supervisor = threading.Thread(target=self.supervise, daemon=True)
+        self.supervisor.start()
+
+    def supervise(self):
+        conn = connect(self.db_path)
+        while not self.stopping.wait(1.0):
+            for worker_id, process in list(self.processes.items()):
+                if process.is_alive() or worker_id in self.failed_workers:
+                    continue
+
+                requeue_tasks(conn, worker_id)
+                conn.execute("UPDATE workers SET restarts = restarts + 1 WHERE id = ?", (worker_id,))
+
+                # A worker registers its pid once the model is loaded; dying
+                # before that (bad install, OOM on load) will not fix itself
+                row = conn.execute("SELECT pid FROM workers WHERE id = ?", (worker_id,)).fetchone()
+                if row is not None and row["pid"] == process.pid:
+                    self.startup_failures[worker_id] = 0
+                else:
+                    self.startup_failures[worker_id] = self.startup_failures.get(worker_id, 0) + 1
+
+                if self.startup_failures[worker_id] >= MAX_STARTUP_FAILURES:
+                    print(f"❌ Job worker {worker_id} failed to start {MAX_STARTUP_FAILURES} times, giving up")
+                    self.failed_workers.add(worker_id)
+                    continue
+
+                print(f"⚠️ Job worker {worker_id} exited ({process.exitcode}), restarting")
+                self.spawn(worker_id)
+        conn.close()
+
+    def stop(self):
+        if not self.started:
+            return
+
+        # Join the supervisor first so it cannot respawn the workers we terminate
+        self.stopping.set()
+        self.supervisor.join()
+        for process in self.processes.values():
+            process.terminate()
+        for process in self.processes.values():
+            process.join(timeout=5)
+
+        conn = connect(self.db_path)
+        requeue_tasks(conn, crashed=False)
+        conn.close()
+
+    def running(self):
+        # False when disabled, not started, shutting down or every worker gave up
+        return (
+            self.started
+            and not self.stopping.is_set()
+            and len(self.failed_workers) < self.num_workers
+        )
+
+    def is_alive(self, worker_id):
+        process = self.processes.get(worker_id)
+        return process is not None and process.is_alive()
+
+
+# ------------------ STATUS ------------------
+
+def job_exists(job_id, db_path=DB_PATH):
+    conn = connect(db_path)
+    row = conn.execute("SELECT 1 FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    conn.close()
+    return row is not None
+
+
+def job_progress(job_id, after_position=-1, db_path=DB_PATH):
+    # Job summary plus finished results, in upload order, past after_position
+    conn = connect(db_path)
+    job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    rows = conn.execute(
+        "SELECT position, status, prediction, confidence, error FROM tasks "
+        "WHERE job_id = ? AND status IN ('done', 'failed') AND position > ? ORDER BY position",
+        (job_id, after_position)
+    ).fetchall()
+    done = conn.execute(
+        "SELECT COUNT(*) FROM tasks WHERE job_id = ? AND status IN ('done', 'failed')",
+        (job_id,)
+    ).fetchone()[0]
+    conn.close()
+    return job, done, rows
+
+
+async def stream_progress(job_id, pool, db_path=DB_PATH):
+    # NDJSON: one line per change in progress, the last one has status 'done'.
+    # Results are only sent once their position is contiguous with what was
+    # already streamed, so every result appears exactly once and in order.
+    # If no worker can drain the queue the stream ends with an 'error' line.
+    sent = -1
+    last_done = None
+    while True:
+        job, done, rows = await asyncio.to_thread(job_progress, job_id, sent, db_path)
+
+        results = []
+        for row in rows:
+            if row["position"] != sent + 1:
+                break
+            sent = row["position"]
+            result = {"index": row["position"], "status": row["status"]}
+            if row["status"] == "done":
+                result.update(prediction=row["prediction"], confidence=row["confidence"])
+            else:
+                result["error"] = row["error"]
+            results.append(result)
+
+        if done != last_done or results or job["status"] == "done":
+            last_done = done
+            yield json.dumps({
+                "job_id": job_id,
+                "status": job["status"],
+                "done": done,
+                "total": job["total"],
+                "results": results
+            }) + "\n"
+
+        if job["status"] == "done" and sent == job["total"] - 1:
+            return
+
+        if not pool.running():
+            yield json.dumps({
+                "job_id": job_id,
+                "status": job["status"],
+                "done": done,
+                "total": job["total"],
+                "error": "No job workers running"
+            }) + "\n"
+            return
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+def metrics(pool, db_path=DB_PATH):
+    conn = connect(db_path)
+    workers = conn.execute("SELECT * FROM workers ORDER BY id").fetchall()
+    queued = conn.execute("SELECT COUNT(*) FROM tasks WHERE status = 'queued'").fetchone()[0]
+    running = conn.execute("SELECT COUNT(*) FROM tasks WHERE status = 'running'").fetchone()[0]
+    conn.close()
+
+    now = time.time()
+    return {
+        "queued": queued,
+        "running": running,
+        "workers": [
+            {
+                "worker": w["id"],
+                "pid": w["pid"],
+                "alive": pool.is_alive(w["id"]),
+                "processed": w["processed"],
+                "failed": w["failed"],
+                "restarts": w["restarts"],
+                "busy_seconds": round(w["busy"], 2),
+                "images_per_second": round(w["processed"] / w["busy"], 2) if w["busy"] else 0.0,
+                "uptime_seconds": round(now - w["started"], 1) if w["started"] else 0.0
+            }
+            for w in workers
+        ]
+    }
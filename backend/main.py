@@ -1,12 +1,19 @@
 from fastapi import FastAPI, File, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from PIL import Image
+from fastapi.responses import StreamingResponse
+from PIL import Image, ImageOps
+from typing import List
+from collections import OrderedDict
 import torch
-import torchvision.transforms as transforms
-import torch.nn as nn
+import torch.nn.functional as F
+import asyncio
+import hashlib
+import base64
 import io
 
-from torchvision.models import vit_b_16
+import jobs
+from inference import model, transform, classes, load_image, classify_images
+from near_duplicate import NEAR_DUPLICATE_CACHE, NearDuplicateIndex, image_hash
 
 app = FastAPI()
 
@@ -18,61 +25,89 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# ------------------ MODEL LOADING ------------------
-
-NUM_CLASSES = 17
-
-try:
-    model = vit_b_16(weights=None)
-
-    # EXACT training head (single Linear at index 1)
-    model.heads = nn.Sequential(
-        nn.Identity(),
-        nn.Linear(768, NUM_CLASSES)
-    )
-
-    state_dict = torch.load("vit_ornament_model.pth", map_location="cpu")
-    model.load_state_dict(state_dict)
-    model.eval()
-
-    print("✅ Model loaded successfully")
-
-except Exception as e:
-    print("❌ Model loading failed:", e)
-    model = None
-    
-# ------------------ IMAGE PREPROCESSING ------------------
-# IMPORTANT: ViT normalization
-transform = transforms.Compose([
-    transforms.Resize((224, 224)),
-    transforms.ToTensor(),
-    transforms.Normalize(
-        mean=[0.485, 0.456, 0.406],
-        std=[0.229, 0.224, 0.225]
-    )
-])
-
-# ------------------ CLASS LABELS ------------------
-
-classes = [
-    'Bajuband',
-    'Bakuli Haar',
-    'Bugadi',
-    'Chinchpeti',
-    'Jodvi',
-    'Kambarpatta',
-    'Kolhapuri Saaj',
-    'Kudya',
-    'Laxmi Haar',
-    'Mangalsutra',
-    'Mohan Mala',
-    'Nath',
-    'Patlya',
-    'Surya Haar',
-    'Tanmani',
-    'Thushi',
-    'Tode'
-]
+# ------------------ NEAR-DUPLICATE CACHE ------------------
+# Off unless NEAR_DUPLICATE_CACHE=1 (see near_duplicate.py)
+
+near_duplicates = NearDuplicateIndex()
+
+
+# ------------------ EXPLAINABILITY ------------------
+# Attention rollout over the 14x14 ViT-B/16 patch grid.
+# torchvision's encoder blocks call MultiheadAttention with need_weights=False,
+# so explain_batch walks the encoder itself (no hooks on the shared model, which
+# other requests use concurrently) and recomputes the softmax(QK^T) maps from
+# each block's ln_1 output and its own projection weights.
+
+GRID_SIZE = 14
+HEATMAP_CACHE_SIZE = 256
+EXPLAIN_MAX_FILES = 32
+EXPLAIN_BATCH_SIZE = 8      # ~7 MB of activations per image
+
+heatmap_cache = OrderedDict()
+
+
+def attention_weights(attn, x):
+    # x: (B, N, D) -> head-averaged attention (B, N, N)
+    B, N, D = x.shape
+    head_dim = D // attn.num_heads
+    q = F.linear(x, attn.in_proj_weight[:D], attn.in_proj_bias[:D])
+    k = F.linear(x, attn.in_proj_weight[D:2 * D], attn.in_proj_bias[D:2 * D])
+    q = q.reshape(B, N, attn.num_heads, head_dim).transpose(1, 2)
+    k = k.reshape(B, N, attn.num_heads, head_dim).transpose(1, 2)
+    weights = torch.softmax(q @ k.transpose(-2, -1) / head_dim ** 0.5, dim=-1)
+    return weights.mean(dim=1)
+
+
+def explain_batch(images):
+    """Run one forward pass over a batch and return (probs, heatmaps).
+
+    heatmaps has shape (B, 14, 14), scaled to [0, 1] per image.
+    """
+    batch = torch.stack([transform(img) for img in images])
+
+    with torch.no_grad():
+        # Same steps as VisionTransformer.forward / Encoder.forward
+        x = model._process_input(batch)
+        class_token = model.class_token.expand(x.shape[0], -1, -1)
+        x = torch.cat([class_token, x], dim=1)
+        x = model.encoder.dropout(x + model.encoder.pos_embedding)
+
+        eye = torch.eye(x.shape[1]).unsqueeze(0)
+        rollout = eye.repeat(x.shape[0], 1, 1)
+
+        for layer in model.encoder.layers:
+            attn = attention_weights(layer.self_attention, layer.ln_1(x))
+            attn = attn + eye
+            attn = attn / attn.sum(dim=-1, keepdim=True)
+            rollout = attn @ rollout
+            x = layer(x)
+
+        x = model.encoder.ln(x)
+        outputs = model.heads(x[:, 0])
+        probs = torch.softmax(outputs, dim=1)
+
+    # CLS token attention to every patch
+    heatmaps = rollout[:, 0, 1:].reshape(-1, GRID_SIZE, GRID_SIZE)
+    flat = heatmaps.flatten(1)
+    lo = flat.min(dim=1).values.view(-1, 1, 1)
+    hi = flat.max(dim=1).values.view(-1, 1, 1)
+    heatmaps = (heatmaps - lo) / (hi - lo + 1e-8)
+
+    return probs, heatmaps
+
+
+def render_overlay(image, heatmap):
+    # Upsample the patch grid, colorize and blend over the model-sized input
+    base = image.resize((224, 224))
+    mask = Image.fromarray((heatmap * 255).byte().numpy())
+    mask = mask.resize((224, 224), Image.BILINEAR)
+    colored = ImageOps.colorize(mask, black="blue", white="red")
+    overlay = Image.blend(base, colored, alpha=0.5)
+
+    buffer = io.BytesIO()
+    overlay.save(buffer, format="PNG", optimize=True)
+    return base64.b64encode(buffer.getvalue()).decode()
+
 
 # ------------------ API ------------------
 
@@ -82,17 +117,139 @@ async def predict_image(file: UploadFile = File(...)):
         return {"error": "Model not loaded"}
 
     image_bytes = await file.read()
-    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    image = load_image(image_bytes)
 
-    img_tensor = transform(image).unsqueeze(0)
+    key, cached = None, None
+    if NEAR_DUPLICATE_CACHE:
+        key = image_hash(image)
+        cached = near_duplicates.lookup(key)
+
+    if cached is None:
+        cached = classify_images([image])[0]
+        if key is not None:
+            near_duplicates.add(key, cached)
+
+    prediction, confidence = cached
+
+    return {
+        "prediction": prediction,
+        "confidence": confidence
+    }
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {
+        "near_duplicate": near_duplicates.stats(),
+        "heatmap_entries": len(heatmap_cache)
+    }
 
-    with torch.no_grad():
-        outputs = model(img_tensor)
-        probs = torch.softmax(outputs, dim=1)
-        predicted = torch.argmax(probs, dim=1).item()
-        confidence = probs[0][predicted].item()
+
+@app.post("/explain")
+async def explain_images(files: List[UploadFile] = File(...), format: str = "array"):
+    if model is None:
+        return {"error": "Model not loaded"}
+
+    if format not in ("array", "png"):
+        return {"error": "format must be 'array' or 'png'"}
+
+    if len(files) > EXPLAIN_MAX_FILES:
+        return {"error": f"At most {EXPLAIN_MAX_FILES} images per request"}
+
+    keys, images = [], []
+    for file in files:
+        image_bytes = await file.read()
+        keys.append(hashlib.sha256(image_bytes).hexdigest())
+        images.append(load_image(image_bytes))
+
+    # Only uncached images go through the model, EXPLAIN_BATCH_SIZE per pass,
+    # off the event loop so the /jobs streams keep flowing
+    entries = {key: heatmap_cache[key] for key in keys if key in heatmap_cache}
+    missing = [i for i, key in enumerate(keys) if key not in entries]
+    for start in range(0, len(missing), EXPLAIN_BATCH_SIZE):
+        chunk = missing[start:start + EXPLAIN_BATCH_SIZE]
+        probs, heatmaps = await asyncio.to_thread(explain_batch, [images[i] for i in chunk])
+        for row, i in enumerate(chunk):
+            predicted = torch.argmax(probs[row]).item()
+            entries[keys[i]] = (predicted, probs[row][predicted].item(), heatmaps[row])
+
+    for key, entry in entries.items():
+        heatmap_cache[key] = entry
+        heatmap_cache.move_to_end(key)
+    while len(heatmap_cache) > HEATMAP_CACHE_SIZE:
+        heatmap_cache.popitem(last=False)
+
+    results = []
+    for key, image in zip(keys, images):
+        predicted, confidence, heatmap = entries[key]
+
+        result = {
+            "prediction": classes[predicted],
+            "confidence": round(confidence, 4)
+        }
+        if format == "png":
+            result["overlay"] = render_overlay(image, heatmap)
+        else:
+            result["heatmap"] = [[round(v, 4) for v in row] for row in heatmap.tolist()]
+        results.append(result)
+
+    return {"results": results}
+
+
+# ------------------ JOBS ------------------
+# Bulk classification without holding the HTTP request open (see jobs.py)
+
+job_pool = jobs.WorkerPool()
+
+
+@app.on_event("startup")
+def start_job_workers():
+    # Workers load their own model copy: only start them for leftover work,
+    # otherwise on the first POST /jobs
+    jobs.init_db()
+    if jobs.has_pending_tasks():
+        job_pool.start()
+
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    job_pool.stop()
+
+
+@app.post("/jobs")
+async def create_job(files: List[UploadFile] = File(...), priority: int = 0):
+    if model is None:
+        return {"error": "Model not loaded"}
+
+    if job_pool.num_workers == 0:
+        return {"error": "Job queue disabled (JOB_WORKERS=0)"}
+
+    if len(files) > jobs.MAX_FILES:
+        return {"error": f"At most {jobs.MAX_FILES} images per job"}
+
+    images = []
+    for file in files:
+        image_bytes = await file.read(jobs.MAX_FILE_BYTES + 1)
+        if len(image_bytes) > jobs.MAX_FILE_BYTES:
+            return {"error": f"Images must be at most {jobs.MAX_FILE_BYTES // (1024 * 1024)} MB"}
+        images.append(image_bytes)
+    job_id = await asyncio.to_thread(jobs.submit, images, priority)
+    job_pool.start()
 
     return {
-        "prediction": classes[predicted],
-        "confidence": round(confidence, 4)
+        "job_id": job_id,
+        "total": len(images)
     }
+
+
+@app.get("/jobs/metrics")
+def job_metrics():
+    return jobs.metrics(job_pool)
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    if not jobs.job_exists(job_id):
+        return {"error": "Job not found"}
+
+    return StreamingResponse(jobs.stream_progress(job_id, job_pool), media_type="application/x-ndjson")
@@ -0,0 +1,97 @@
+import os
+from collections import OrderedDict
+
+from PIL import Image
+
+# ------------------ NEAR-DUPLICATE CACHE ------------------
+# Re-uploads of the same photo (resized, recompressed, screenshotted) skip the
+# ViT forward: a 64-bit difference hash of the decoded image is matched against
+# recent predictions by Hamming distance. On the asset images, resized and
+# JPEG-recompressed copies stay within 2 bits of the original, while distinct
+# ornaments are at least 15 bits apart. A hit serves another upload's label, and
+# 17 images (one per class) say nothing about distinct photos of the same
+# class, so the cache is opt-in (NEAR_DUPLICATE_CACHE=1) until
+# near_duplicate_report.py has been run on a real dataset.
+# Kept free of torch so the report's --hash-only check runs without the model.
+
+NEAR_DUPLICATE_CACHE = os.environ.get("NEAR_DUPLICATE_CACHE", "0") == "1"
+HASH_SIZE = 8
+MAX_HASH_DISTANCE = 6
+NEAR_DUPLICATE_CACHE_SIZE = 4096
+# Neighbouring thumbnail pixels closer than this are a tie, and a bit decided
+# by a tie is noise. Flat, very dark or over-exposed images are mostly ties
+# (a blank image hashes to 0); the asset images have at least 20 stable bits.
+HASH_TIE_LEVEL = 2
+MIN_STABLE_BITS = 16
+
+
+def image_hash(image):
+    # dHash: sign of the horizontal gradient on a (HASH_SIZE+1) x HASH_SIZE thumbnail.
+    # Returns None when too few bits are stable to identify the image.
+    gray = image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS)
+    pixels = gray.tobytes()
+
+    bits = stable = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            left, right = pixels[offset + col], pixels[offset + col + 1]
+            bits = (bits << 1) | (left > right)
+            stable += abs(left - right) > HASH_TIE_LEVEL
+
+    if stable < MIN_STABLE_BITS:
+        return None
+    return bits
+
+
+class NearDuplicateIndex:
+    """Bounded LRU of image hash -> prediction with Hamming-distance lookup."""
+
+    def __init__(self, max_size=NEAR_DUPLICATE_CACHE_SIZE, max_distance=MAX_HASH_DISTANCE):
+        self.max_size = max_size
+        self.max_distance = max_distance
+        self.entries = OrderedDict()
+        self.lookups = 0
+        self.hits = 0
+        self.skipped = 0
+
+    def lookup(self, key):
+        # key is None for low-information images: never cached, always a miss
+        if key is None:
+            self.skipped += 1
+            return None
+
+        self.lookups += 1
+
+        match = key if key in self.entries else None
+        if match is None:
+            # A linear scan of popcounts over a few thousand ints is well
+            # under a millisecond, negligible next to the forward pass
+            best = self.max_distance + 1
+            for candidate in self.entries:
+                distance = (candidate ^ key).bit_count()
+                if distance < best:
+                    match, best = candidate, distance
+
+        if match is None:
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(match)
+        return self.entries[match]
+
+    def add(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        return {
+            "enabled": NEAR_DUPLICATE_CACHE,
+            "entries": len(self.entries),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            "skipped_low_information": self.skipped
+        }
@@ -0,0 +1,137 @@
+import argparse
+import glob
+import io
+import itertools
+import os
+
+from PIL import Image, ImageOps
+
+import near_duplicate
+
+# Hit rate and accuracy impact of the near-duplicate cache in /predict.
+#
+# --hash-only (no model needed): checks that distinct photos, within the same
+# class and across classes, stay further apart than MAX_HASH_DISTANCE, and how
+# many resized / recompressed / screenshot-like copies would hit.
+#
+# Default: also classifies every copy with the model and compares the accuracy
+# of the model's own prediction with the one the cache would have served.
+# Run from backend/ so the model weights are found:
+#   python near_duplicate_report.py [--dataset DIR] [--hash-only]
+# DIR holds one subfolder per class; the default is the frontend asset images
+# (one per class, label taken from the file name).
+
+ASSETS = os.path.join(os.path.dirname(__file__), "..", "frontend", "assets", "Ornaments")
+
+
+def load_dataset(root):
+    # [(label, path), ...] from class subfolders, or flat files named by class
+    folders = sorted(d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d)))
+    if folders:
+        return [
+            (folder, path)
+            for folder in folders
+            for path in sorted(glob.glob(os.path.join(root, folder, "*")))
+        ]
+    return [
+        (os.path.splitext(os.path.basename(path))[0].replace("_", " ").title(), path)
+        for path in sorted(glob.glob(os.path.join(root, "*")))
+    ]
+
+
+def reencode(image, fmt, **kwargs):
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **kwargs)
+    return Image.open(io.BytesIO(buffer.getvalue())).convert("RGB")
+
+
+def variants(image):
+    w, h = image.size
+    screenshot = ImageOps.expand(
+        image.resize((int(w * 0.8), int(h * 0.8))), border=max(2, w // 50), fill="white"
+    )
+    return {
+        "resize 50%": image.resize((w // 2, h // 2)),
+        "resize 25%": image.resize((max(1, w // 4), max(1, h // 4))),
+        "jpeg q60": reencode(image, "JPEG", quality=60),
+        "jpeg q30": reencode(image, "JPEG", quality=30),
+        "screenshot": reencode(screenshot, "PNG"),
+    }
+
+
+def separation_report(samples):
+    # Distinct photos closer than the threshold would share a cached label
+    hashes = [(label, near_duplicate.image_hash(image)) for label, image in samples]
+    hashed = [(label, key) for label, key in hashes if key is not None]
+    print(f"{len(samples)} images, {len(samples) - len(hashed)} low-information (never cached)")
+
+    for name, same in (("same class", True), ("cross class", False)):
+        distances = [
+            (a_key ^ b_key).bit_count()
+            for (a_label, a_key), (b_label, b_key) in itertools.combinations(hashed, 2)
+            if (a_label == b_label) == same
+        ]
+        if not distances:
+            print(f"{name:<12} no pairs")
+            continue
+        collisions = sum(d <= near_duplicate.MAX_HASH_DISTANCE for d in distances)
+        print(f"{name:<12} {len(distances):>6} pairs   min distance {min(distances):>2}   "
+              f"within threshold ({near_duplicate.MAX_HASH_DISTANCE}): {collisions}")
+    print()
+
+
+def report(dataset, hash_only):
+    samples = [(label, Image.open(path).convert("RGB")) for label, path in dataset]
+    separation_report(samples)
+
+    if not hash_only:
+        import inference
+
+    index = near_duplicate.NearDuplicateIndex()
+    sources = {}
+    for i, (label, image) in enumerate(samples):
+        key = near_duplicate.image_hash(image)
+        if key is not None:
+            index.add(key, i)
+        sources[i] = label
+
+    header = f"{'variant':<12} {'hit rate':>9} {'wrong hits':>11}"
+    if not hash_only:
+        header += f" {'acc (model)':>12} {'acc (cached)':>13}"
+    print(header)
+
+    copies = [variants(image) for _, image in samples]
+    for name in copies[0]:
+        hits = wrong = model_correct = served_correct = 0
+        for i, (label, _) in enumerate(samples):
+            copy = copies[i][name]
+            match = index.lookup(near_duplicate.image_hash(copy))
+            hits += match is not None
+            wrong += match is not None and match != i
+
+            if not hash_only:
+                # What the cache serves is the model's label for the matched upload
+                predicted, _ = inference.classify_images([copy])[0]
+                served = predicted
+                if match is not None:
+                    served, _ = inference.classify_images([samples[match][1]])[0]
+                model_correct += predicted == label
+                served_correct += served == label
+
+        n = len(samples)
+        line = f"{name:<12} {hits / n:>9.0%} {wrong:>11}"
+        if not hash_only:
+            line += f" {model_correct / n:>12.0%} {served_correct / n:>13.0%}"
+        print(line)
+
+    stats = index.stats()
+    print(f"\noverall hit rate {stats['hit_rate']:.0%} over {stats['lookups']} lookups "
+          f"({stats['skipped_low_information']} copies skipped as low-information)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", default=ASSETS)
+    parser.add_argument("--hash-only", action="store_true")
+    args = parser.parse_args()
+    report(load_dataset(args.dataset), args.hash_only)
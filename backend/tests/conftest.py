@@ -0,0 +1,5 @@
+import os
+import sys
+
+# backend/ is run as a flat script directory (uvicorn main:app), not a package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
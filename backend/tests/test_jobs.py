@@ -0,0 +1,147 @@
+import asyncio
+import json
+
+import pytest
+
+import jobs
+
+
+class FakePool:
+    def __init__(self, running=True):
+        self._running = running
+
+    def running(self):
+        return self._running
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    jobs.init_db(path)
+    conn = jobs.connect(path)
+    yield path, conn
+    conn.close()
+
+
+def task(conn, job_id, position):
+    return conn.execute(
+        "SELECT * FROM tasks WHERE job_id = ? AND position = ?", (job_id, position)
+    ).fetchone()
+
+
+def mark_done(conn, job_id, position):
+    conn.execute(
+        "UPDATE tasks SET status = 'done', prediction = 'Nath', confidence = 0.9 "
+        "WHERE job_id = ? AND position = ?",
+        (job_id, position)
+    )
+    jobs.finish_jobs(conn, [job_id])
+
+
+def collect(job_id, pool, path):
+    async def run():
+        return [json.loads(line) async for line in jobs.stream_progress(job_id, pool, path)]
+    return asyncio.run(run())
+
+
+def test_claim_returns_nothing_when_idle(db):
+    path, conn = db
+    assert jobs.claim_tasks(conn, worker_id=0) == []
+
+
+def test_claim_orders_by_priority(db):
+    path, conn = db
+    low = jobs.submit([b"a", b"b"], priority=0, db_path=path)
+    high = jobs.submit([b"c"], priority=5, db_path=path)
+
+    rows = jobs.claim_tasks(conn, worker_id=0)
+
+    assert [row["image"] for row in rows] == [b"c", b"a", b"b"]
+    assert rows[0]["job_id"] == high
+    assert task(conn, low, 0)["status"] == "running"
+
+
+def test_crash_survivors_are_retried_one_at_a_time(db):
+    path, conn = db
+    job_id = jobs.submit([b"a", b"b", b"c"], db_path=path)
+    assert len(jobs.claim_tasks(conn, worker_id=0)) == 3
+
+    jobs.requeue_tasks(conn, worker_id=0)
+
+    for position in range(3):
+        rows = jobs.claim_tasks(conn, worker_id=1)
+        assert [row["image"] for row in rows] == [[b"a", b"b", b"c"][position]]
+        assert task(conn, job_id, position)["attempts"] == 2
+
+
+def test_task_fails_after_max_attempts(db):
+    path, conn = db
+    job_id = jobs.submit([b"poison"], db_path=path)
+
+    for attempt in range(jobs.MAX_ATTEMPTS):
+        assert len(jobs.claim_tasks(conn, worker_id=0)) == 1
+        jobs.requeue_tasks(conn, worker_id=0)
+
+    row = task(conn, job_id, 0)
+    assert row["status"] == "failed"
+    assert row["error"] == "Worker crashed"
+    assert jobs.claim_tasks(conn, worker_id=0) == []
+    assert conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()[0] == "done"
+
+
+def test_clean_shutdown_hands_back_the_attempt(db):
+    path, conn = db
+    job_id = jobs.submit([b"a"], db_path=path)
+    jobs.claim_tasks(conn, worker_id=0)
+
+    jobs.requeue_tasks(conn, crashed=False)
+
+    row = task(conn, job_id, 0)
+    assert row["status"] == "queued"
+    assert row["attempts"] == 0
+    assert row["worker"] is None
+
+
+def test_stream_sends_results_once_and_in_order(db, monkeypatch):
+    path, conn = db
+    monkeypatch.setattr(jobs, "POLL_INTERVAL", 0)
+    job_id = jobs.submit([b"a", b"b", b"c"], db_path=path)
+    mark_done(conn, job_id, 1)
+    mark_done(conn, job_id, 2)
+
+    async def run():
+        stream = jobs.stream_progress(job_id, FakePool(), path)
+        first = json.loads(await stream.__anext__())
+        mark_done(conn, job_id, 0)
+        rest = [json.loads(line) async for line in stream]
+        return first, rest
+
+    first, rest = asyncio.run(run())
+
+    # Position 0 is still pending, so 1 and 2 are held back
+    assert first["done"] == 2
+    assert first["results"] == []
+    assert [r["index"] for line in rest for r in line["results"]] == [0, 1, 2]
+    assert rest[-1]["status"] == "done"
+
+
+def test_stream_ends_with_error_without_workers(db):
+    path, conn = db
+    job_id = jobs.submit([b"a"], db_path=path)
+
+    lines = collect(job_id, FakePool(running=False), path)
+
+    assert lines[-1]["error"] == "No job workers running"
+    assert lines[-1]["done"] == 0
+
+
+def test_stream_of_finished_job_needs_no_workers(db):
+    path, conn = db
+    job_id = jobs.submit([b"a"], db_path=path)
+    mark_done(conn, job_id, 0)
+
+    lines = collect(job_id, FakePool(running=False), path)
+
+    assert len(lines) == 1
+    assert lines[0]["status"] == "done"
+    assert lines[0]["results"][0]["prediction"] == "Nath"
@@ -327,6 +327,23 @@ def google_links(name):
         "shopping": f"https://www.google.com/search?tbm=shop&q={q}",
     }
 
+# ------------------ EXPLAINABILITY ------------------
+def fetch_heatmap(image_bytes):
+    # Attention-rollout overlay from /explain -> (png bytes, label it explains),
+    # or (None, error message)
+    response = requests.post(
+        "http://127.0.0.1:8000/explain",
+        params={"format": "png"},
+        files={"files": image_bytes},
+        timeout=10
+    )
+    result = response.json() if response.status_code == 200 else {}
+    if response.status_code != 200 or "error" in result:
+        return None, result.get("error", f"Backend error ({response.status_code})")
+
+    result = result["results"][0]
+    return base64.b64decode(result["overlay"]), result["prediction"]
+
 # ------------------ PREDICTION ------------------
 st.markdown("<div class='main-card'>", unsafe_allow_html=True)
 
@@ -339,6 +356,9 @@ if uploaded_file:
     image = Image.open(uploaded_file).convert("RGB")
     st.image(image, width=320)
 
+    # The heatmap costs a second, slower forward pass, so it is opt-in
+    show_heatmap = st.checkbox("🔥 Show attention heatmap")
+
     if st.button("🔮 Predict Ornament"):
         with st.spinner("Analyzing image..."):
             response = requests.post(
@@ -346,18 +366,29 @@ if uploaded_file:
                 files={"file": uploaded_file.getvalue()},
                 timeout=5
             )
+            result = response.json() if response.status_code == 200 else {}
 
-            if response.status_code == 200:
-                result = response.json()
+            if response.status_code != 200 or "error" in result:
+                st.error(result.get("error", f"Backend error ({response.status_code})"))
+            else:
                 pred = result["prediction"]
                 conf = result.get("confidence", 0)
 
-                st.markdown(f"""
-                <div class="result-card">
-                    <div class="prediction">{pred}</div>
-                    <div class="confidence">Confidence: {round(conf*100,2)}%</div>
-                </div>
-                """, unsafe_allow_html=True)
+                col1, col2 = st.columns(2) if show_heatmap else (st.container(), None)
+                with col1:
+                    st.markdown(f"""
+                    <div class="result-card">
+                        <div class="prediction">{pred}</div>
+                        <div class="confidence">Confidence: {round(conf*100,2)}%</div>
+                    </div>
+                    """, unsafe_allow_html=True)
+                if show_heatmap:
+                    with col2:
+                        overlay, explained = fetch_heatmap(uploaded_file.getvalue())
+                        if overlay:
+                            st.image(overlay, caption=f"🔥 Where the model looked ({explained})", width=224)
+                        else:
+                            st.warning(explained)
 
                 info = ornament_info.get(pred)
                 links = google_links(pred)